@@ -9,6 +9,12 @@ class Settings(BaseSettings):
     night_time_end: str = "06:00"
     api_base_url: str = "https://api.metrobilbao.eus/metro/real-time"
     auto_refresh_interval: int = 10
+    # Query the API for each transfer leg (real connecting-train times);
+    # disable to time transfers from the local stop-count model only
+    transfer_leg_lookup: bool = True
+    # Visitor data and the route cache live in process memory, so keep one
+    # worker unless those are moved out of process
+    workers: int = 1
 
     class Config:
         env_file = ".env"
@@ -1,64 +1,107 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Depends, FastAPI, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
-from route_planner import RoutePlanner
-from metro_client import MetroClient
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from pydantic import AfterValidator
+from route_planner import RoutePlanner, format_clock_time, seconds_of_day
+from route_cache import SingleFlightTTLCache
+from stations import STATIONS
+from metro_client import get_metro_client
+from visitor_counter import HyperLogLog
+from config import get_settings
 import os
-import json
+import orjson
+import msgspec
+import xxhash
+import zlib
 import logging
+import queue
+import atexit
+import pytz
+import asyncio
 from datetime import datetime
 from collections import defaultdict
-from contextlib import asynccontextmanager
-
-# Configure logging
+from logging.handlers import QueueHandler, QueueListener
+from contextlib import asynccontextmanager, suppress
+from typing import Annotated
+
+# Configure logging - records are queued and written by a listener thread,
+# so request handlers never block on file or console writes
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(
+    log_queue,
+    logging.FileHandler('metro_app.log'),
+    logging.StreamHandler(),  # Also print to console
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('metro_app.log'),
-        logging.StreamHandler()  # Also print to console
-    ]
+    handlers=[QueueHandler(log_queue)]
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Persistence file path
 DATA_FILE = "visitor_data.json"
 
+# Server timezone reported by /api/time
+MADRID_TZ = pytz.timezone("Europe/Madrid")
+
+
+def hash_visitor_id(visitor_id: str) -> int:
+    """Reduce an "ip:user-agent" identifier to a 64-bit integer key"""
+    return xxhash.xxh3_64_intdigest(visitor_id.encode("utf-8"))
+
 
 def load_visitor_data():
     """Load visitor data from JSON file"""
     if os.path.exists(DATA_FILE):
         try:
-            with open(DATA_FILE, "r") as f:
-                data = json.load(f)
+            with open(DATA_FILE, "rb") as f:
+                data = orjson.loads(f.read())
                 # Convert date string back to date object
                 if "date" in data:
                     data["date"] = datetime.fromisoformat(data["date"]).date()
-                # Convert visitors list back to set
-                if "visitors" in data:
-                    data["visitors"] = set(data["visitors"])
+                # The count is re-estimated from the sketch when read
+                data.pop("count", None)
+                # Rebuild the visitor sketch
+                if "sketch" in data:
+                    data["sketch"] = HyperLogLog.deserialize(data["sketch"])
+                else:
+                    # Older files listed every visitor (raw "ip:ua" strings or hashes)
+                    data["sketch"] = HyperLogLog()
+                    for v in data.pop("visitors", []):
+                        data["sketch"].add(v if isinstance(v, int) else hash_visitor_id(v))
                 return data
-        except (json.JSONDecodeError, ValueError) as e:
+        except (orjson.JSONDecodeError, ValueError, zlib.error) as e:
             print(f"Error loading visitor data: {e}. Starting fresh.")
     
     # Return default structure if file doesn't exist or has errors
-    return {"date": datetime.now().date(), "visitors": set(), "count": 0}
+    return {"date": datetime.now().date(), "sketch": HyperLogLog()}
 
 
-def save_visitor_data():
-    """Save visitor data to JSON file"""
+def snapshot_visitor_data():
+    """Copy visitor data into a JSON-ready dict (call from the event loop)"""
+    return {
+        "date": visitor_data["date"].isoformat(),
+        "sketch": visitor_data["sketch"].serialize(),
+        "count": visitor_data["sketch"].count(),
+    }
+
+
+def save_visitor_data(snapshot: dict) -> bool:
+    """Save a visitor data snapshot to JSON file, returning whether it worked"""
+    tmp_file = f"{DATA_FILE}.tmp"
     try:
-        data_to_save = {
-            "date": visitor_data["date"].isoformat(),
-            "visitors": list(visitor_data["visitors"]),  # Convert set to list for JSON
-            "count": visitor_data["count"],
-        }
-        with open(DATA_FILE, "w") as f:
-            json.dump(data_to_save, f, indent=2)
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(snapshot, option=orjson.OPT_INDENT_2))
+        # Swap in the complete file so a crash never leaves a truncated one
+        os.replace(tmp_file, DATA_FILE)
+        return True
     except Exception as e:
         print(f"Error saving visitor data: {e}")
+        return False
 
 
 @asynccontextmanager
@@ -67,15 +110,80 @@ async def lifespan(app: FastAPI):
     global visitor_data
     # Startup: Load persisted data
     visitor_data = load_visitor_data()
-    logger.info(f"Application started - Loaded visitor data: {visitor_data['count']} visitors on {visitor_data['date']}")
-    print(f"Loaded visitor data: {visitor_data['count']} visitors on {visitor_data['date']}")
+    logger.info(f"Application started - Loaded visitor data: {visitor_data['sketch'].count()} visitors on {visitor_data['date']}")
+    print(f"Loaded visitor data: {visitor_data['sketch'].count()} visitors on {visitor_data['date']}")
+
+    # Visitor hits are queued by request handlers and applied by a single consumer
+    app.state.visitor_queue = asyncio.Queue(maxsize=VISITOR_QUEUE_SIZE)
+    visitor_task = asyncio.create_task(drain_visitor_queue(app.state.visitor_queue))
+    save_task = asyncio.create_task(periodic_save_visitor_data())
     
     yield
     
-    # Shutdown: Save data
-    save_visitor_data()
-    logger.info(f"Application shutting down - Saved visitor data: {visitor_data['count']} visitors")
-    print(f"Saved visitor data: {visitor_data['count']} visitors")
+    # Shutdown: Apply any queued hits, then save data
+    for task in (visitor_task, save_task):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Cancelling save_task doesn't stop its thread - let it finish before writing again
+    if visitor_save_task is not None:
+        await visitor_save_task
+    while not app.state.visitor_queue.empty():
+        track_visitor(*app.state.visitor_queue.get_nowait())
+    save_visitor_data(snapshot_visitor_data())
+    await metro_client.aclose()
+    logger.info(f"Application shutting down - Saved visitor data: {visitor_data['sketch'].count()} visitors")
+    print(f"Saved visitor data: {visitor_data['sketch'].count()} visitors")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson instead of the stdlib encoder"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+# Precomputed CORS headers - the API is public and uses no credentials
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+PREFLIGHT_HEADERS = CORS_HEADERS + [
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-max-age", b"600"),
+]
+
+# Headers for 500 responses built by the app-level exception handler
+ERROR_HEADERS = {name.decode("latin-1"): value.decode("latin-1") for name, value in CORS_HEADERS}
+
+
+class OpenCORSMiddleware:
+    """
+    Minimal ASGI CORS middleware allowing any origin
+
+    Answers preflight requests directly and appends the allow-origin header to
+    every other HTTP response, without per-request origin matching.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and any(
+            name == b"access-control-request-method" for name, _ in scope["headers"]
+        ):
+            await send({"type": "http.response.start", "status": 204, "headers": PREFLIGHT_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + CORS_HEADERS
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
 
 
 app = FastAPI(
@@ -83,101 +191,231 @@ app = FastAPI(
     description="Real-time metro information and route planning for Metro Bilbao",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Enable CORS for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(OpenCORSMiddleware)
+
+
+def get_client_ip(request: Request) -> str:
+    """Client address for logging and visitor tracking"""
+    return request.client.host if request.client else "unknown"
+
+
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """Log unexpected errors once and turn them into a JSON 500 response"""
+    client_ip = get_client_ip(request)
+    logger.error(f"Error handling {request.method} {request.url.path} - IP: {client_ip} - Error: {str(exc)}")
+    if request.url.path.startswith("/api/route"):
+        detail = f"Error fetching route: {str(exc)}"
+    elif request.url.path.startswith("/api/process"):
+        detail = f"Error processing route data: {str(exc)}"
+    else:
+        detail = f"Error processing request: {str(exc)}"
+    # Exception handlers run outside OpenCORSMiddleware, so add the CORS header here
+    return ORJSONResponse(status_code=500, content={"detail": detail}, headers=ERROR_HEADERS)
 
 # Initialize services
-route_planner = RoutePlanner()
-metro_client = MetroClient()
+metro_client = get_metro_client()
+route_planner = RoutePlanner(metro_client)
+
+# Serialized once at import - the station list never changes at runtime
+STATIONS_JSON = orjson.dumps({"stations": dict(STATIONS)})
+STATIONS_ETAG = f'"{xxhash.xxh3_64_hexdigest(STATIONS_JSON)}"'
+STATIONS_HEADERS = {"Cache-Control": "public, max-age=86400", "ETag": STATIONS_ETAG}
+
+# Route data is real-time, but reused server-side for one refresh interval anyway
+ROUTE_CACHE_CONTROL = f"public, max-age={get_settings().auto_refresh_interval}"
+
+# Static frontend
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+INDEX_HTML_PATH = os.path.join(STATIC_DIR, "index.html")
+
+FALLBACK_HTML = """
+    <html>
+        <head><title>Metro Bilbao</title></head>
+        <body>
+            <h1>Metro Bilbao API</h1>
+            <p>API is running. Access the interactive interface at /static/index.html</p>
+            <p>API documentation: <a href="/docs">/docs</a></p>
+        </body>
+    </html>
+    """
+
+
+def load_index_html():
+    """Read the main HTML page once so it can be served from memory"""
+    if os.path.exists(INDEX_HTML_PATH):
+        with open(INDEX_HTML_PATH, "rb") as f:
+            return f.read()
+    return FALLBACK_HTML.encode("utf-8")
+
+
+INDEX_HTML = load_index_html()
+INDEX_HEADERS = {"ETag": f'"{xxhash.xxh3_64_hexdigest(INDEX_HTML)}"'}
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check whether the client already holds the representation tagged `etag`"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
+
+# Short-lived route cache: (origin, destination) -> (expiry, shared fetch task)
+ROUTE_CACHE_MAX_SIZE = 256
+route_cache = SingleFlightTTLCache(get_settings().auto_refresh_interval, ROUTE_CACHE_MAX_SIZE)
+
+
+async def cached_get_route(origin: str, destination: str):
+    """
+    Get route information, collapsing identical queries into one upstream fetch
+
+    Results are reused for `auto_refresh_interval` seconds, and concurrent
+    requests for the same pair await the same in-flight fetch.
+    """
+    return await route_cache.get_or_fetch(
+        (origin, destination), lambda: route_planner.get_route(origin, destination)
+    )
+
+
+# Visitor tracking queue limits
+VISITOR_QUEUE_SIZE = 10000
+VISITOR_BATCH_SIZE = 256
+
+# Seconds between visitor data flushes - bounds how much is lost on a crash
+VISITOR_SAVE_INTERVAL = 30
 
 # Visitor tracking (will be loaded from file in lifespan)
-visitor_data = {"date": datetime.now().date(), "visitors": set(), "count": 0}
+visitor_data = {"date": datetime.now().date(), "sketch": HyperLogLog()}
+visitor_data_dirty = False
+# Background save currently running in a worker thread, if any
+visitor_save_task = None
+
+
+# Station codes are case-insensitive; normalize them once during validation
+StationCode = Annotated[str, AfterValidator(str.upper)]
+
+# Resolved once per request by FastAPI's dependency cache
+ClientIP = Annotated[str, Depends(get_client_ip)]
 
 
-class RouteRequest(BaseModel):
+class RouteRequest(msgspec.Struct):
     """Request model for route queries"""
 
     origin: str
     destination: str
 
+    def __post_init__(self):
+        self.origin = self.origin.upper()
+        self.destination = self.destination.upper()
 
-class ProcessRouteRequest(BaseModel):
+
+class ProcessRouteRequest(msgspec.Struct):
     """Request model for processing raw Metro API data"""
 
     data: dict
 
 
-def track_visitor(request: Request):
+async def decode_body(request: Request, model: type):
+    """Decode and validate a JSON request body in a single msgspec pass"""
+    try:
+        return msgspec.json.decode(await request.body(), type=model)
+    except msgspec.ValidationError as e:
+        # Keep FastAPI's list-shaped 422 detail
+        raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(e), "input": None}])
+    except msgspec.DecodeError as e:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": "JSON decode error", "input": {}, "ctx": {"error": str(e)}}]
+        )
+
+
+def track_visitor(client_ip: str, user_agent: str):
     """Track unique visitors by IP and user agent"""
-    global visitor_data
+    global visitor_data_dirty
 
     # Reset counter if it's a new day
     current_date = datetime.now().date()
     if visitor_data["date"] != current_date:
-        logger.info(f"Daily reset - Previous count: {visitor_data['count']} on {visitor_data['date']}")
+        logger.info(f"Daily reset - Previous count: {visitor_data['sketch'].count()} on {visitor_data['date']}")
         visitor_data["date"] = current_date
-        visitor_data["visitors"] = set()
-        visitor_data["count"] = 0
-        # Save the reset data
-        save_visitor_data()
+        visitor_data["sketch"] = HyperLogLog()
+        visitor_data_dirty = True
 
     # Create unique identifier from IP and user agent
-    client_ip = request.client.host if request.client else "unknown"
+    visitor_id = hash_visitor_id(f"{client_ip}:{user_agent}")
+
+    # Adding is O(1); the count is only estimated when someone reads it
+    if visitor_data["sketch"].add(visitor_id):
+        logger.info(f"New visitor - IP: {client_ip} - User Agent: {user_agent[:50]}...")
+        visitor_data_dirty = True
+
+
+async def periodic_save_visitor_data():
+    """Flush changed visitor data to disk every VISITOR_SAVE_INTERVAL seconds"""
+    global visitor_data_dirty, visitor_save_task
+    while True:
+        await asyncio.sleep(VISITOR_SAVE_INTERVAL)
+        if visitor_data_dirty:
+            # Snapshot on the loop so the drain task can't change the data mid-save;
+            # changes made while the thread writes mark the data dirty again
+            snapshot = snapshot_visitor_data()
+            visitor_data_dirty = False
+            visitor_save_task = asyncio.ensure_future(asyncio.to_thread(save_visitor_data, snapshot))
+            if not await asyncio.shield(visitor_save_task):
+                # Retry on the next tick
+                visitor_data_dirty = True
+
+
+async def drain_visitor_queue(queue: asyncio.Queue):
+    """Apply queued visitor hits in batches from a single long-running task"""
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < VISITOR_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+
+        for client_ip, user_agent in batch:
+            try:
+                track_visitor(client_ip, user_agent)
+            except Exception as e:
+                logger.error(f"Error tracking visitor - IP: {client_ip} - Error: {str(e)}")
+
+
+def enqueue_visitor(request: Request, client_ip: str):
+    """Queue this visitor for tracking without touching shared state"""
     user_agent = request.headers.get("user-agent", "")
-    visitor_id = f"{client_ip}:{user_agent}"
-
-    # Add to set if new visitor
-    if visitor_id not in visitor_data["visitors"]:
-        visitor_data["visitors"].add(visitor_id)
-        visitor_data["count"] = len(visitor_data["visitors"])
-        logger.info(f"New visitor #{visitor_data['count']} - IP: {client_ip} - User Agent: {user_agent[:50]}...")
-        # Save data when a new visitor is tracked
-        save_visitor_data()
+    try:
+        request.app.state.visitor_queue.put_nowait((client_ip, user_agent))
+    except asyncio.QueueFull:
+        # Only analytics - drop the hit rather than slow down the request
+        pass
 
 
 @app.get("/api/visitors")
-async def get_visitor_count(request: Request):
+async def get_visitor_count(request: Request, client_ip: ClientIP):
     """Get current visitor count and track this visitor"""
-    track_visitor(request)
-    return {"count": visitor_data["count"]}
+    enqueue_visitor(request, client_ip)
+    return {"count": visitor_data["sketch"].count()}
 
 
 @app.get("/")
-async def root(request: Request):
+async def root(request: Request, client_ip: ClientIP):
     """Serve the main HTML page"""
-    track_visitor(request)
-    client_ip = request.client.host if request.client else "unknown"
+    enqueue_visitor(request, client_ip)
     logger.info(f"Root page accessed - IP: {client_ip}")
-    html_path = os.path.join(os.path.dirname(__file__), "static", "index.html")
-
-    if os.path.exists(html_path):
-        with open(html_path, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-
-    return HTMLResponse(
-        content="""
-    <html>
-        <head><title>Metro Bilbao</title></head>
-        <body>
-            <h1>Metro Bilbao API</h1>
-            <p>API is running. Access the interactive interface at /static/index.html</p>
-            <p>API documentation: <a href="/docs">/docs</a></p>
-        </body>
-    </html>
-    """
-    )
+    if is_not_modified(request, INDEX_HEADERS["ETag"]):
+        return Response(status_code=304, headers=INDEX_HEADERS)
+    return HTMLResponse(content=INDEX_HTML, headers=INDEX_HEADERS)
 
 
 @app.get("/api/route/{origin}/{destination}")
-async def get_route(origin: str, destination: str, request: Request):
+async def get_route(
+    origin: StationCode, destination: StationCode, client_ip: ClientIP, response: Response
+):
     """
     Get route information between two stations
 
@@ -188,18 +426,16 @@ async def get_route(origin: str, destination: str, request: Request):
     Returns:
         Complete route information including trains, exits, transfers, etc.
     """
-    client_ip = request.client.host if request.client else "unknown"
-    logger.info(f"Route query: {origin.upper()} → {destination.upper()} - IP: {client_ip}")
-    try:
-        route_data = await route_planner.get_route(origin.upper(), destination.upper())
-        return JSONResponse(content=route_data)
-    except Exception as e:
-        logger.error(f"Error fetching route {origin} → {destination} - IP: {client_ip} - Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching route: {str(e)}")
+    logger.info(f"Route query: {origin} → {destination} - IP: {client_ip}")
+    route_data = await cached_get_route(origin, destination)
+    response.headers["Cache-Control"] = ROUTE_CACHE_CONTROL
+    return route_data
 
 
 @app.get("/api/route/{origin}/{destination}/formatted")
-async def get_route_formatted(origin: str, destination: str, request: Request):
+async def get_route_formatted(
+    origin: StationCode, destination: StationCode, client_ip: ClientIP, response: Response
+):
     """
     Get pretty-printed route information as plain text
 
@@ -210,141 +446,117 @@ async def get_route_formatted(origin: str, destination: str, request: Request):
     Returns:
         Formatted text representation of route information
     """
-    client_ip = request.client.host if request.client else "unknown"
-    logger.info(f"Formatted route query: {origin.upper()} → {destination.upper()} - IP: {client_ip}")
-    try:
-        route_data = await route_planner.get_route(origin.upper(), destination.upper())
+    logger.info(f"Formatted route query: {origin} → {destination} - IP: {client_ip}")
+    route_data = await cached_get_route(origin, destination)
+    response.headers["Cache-Control"] = ROUTE_CACHE_CONTROL
 
-        formatted_text = route_data.get("formatted", "No information available")
+    formatted_text = route_data.get("formatted", "No information available")
 
-        # Add transfer information if available
-        if route_data.get("transferOptions"):
-            formatted_text += "\n" + route_planner.format_transfer_info(
-                route_data["transferOptions"]
-            )
+    # Add transfer information if available
+    if route_data.get("transferOptions"):
+        formatted_text += "\n" + route_planner.format_transfer_info(
+            route_data["transferOptions"]
+        )
 
-        return {"formatted": formatted_text, "data": route_data}
-    except Exception as e:
-        logger.error(f"Error fetching formatted route {origin} → {destination} - IP: {client_ip} - Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching route: {str(e)}")
+    return {"formatted": formatted_text, "data": route_data}
 
 
 @app.post("/api/route")
-async def post_route(route_request: RouteRequest, request: Request):
+async def post_route(request: Request, client_ip: ClientIP):
     """
     Get route information (POST method)
 
     Args:
-        route_request: RouteRequest with origin and destination
+        request: Request whose JSON body is a RouteRequest (origin and destination)
 
     Returns:
         Complete route information
     """
-    client_ip = request.client.host if request.client else "unknown"
-    logger.info(f"POST route query: {route_request.origin.upper()} → {route_request.destination.upper()} - IP: {client_ip}")
-    try:
-        route_data = await route_planner.get_route(
-            route_request.origin.upper(), route_request.destination.upper()
-        )
-        return JSONResponse(content=route_data)
-    except Exception as e:
-        logger.error(f"Error in POST route {route_request.origin} → {route_request.destination} - IP: {client_ip} - Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching route: {str(e)}")
+    route_request = await decode_body(request, RouteRequest)
+    logger.info(f"POST route query: {route_request.origin} → {route_request.destination} - IP: {client_ip}")
+    route_data = await cached_get_route(route_request.origin, route_request.destination)
+    return route_data
 
 
 @app.post("/api/process")
-async def process_route_data(process_request: ProcessRouteRequest, request: Request):
+async def process_route_data(request: Request, client_ip: ClientIP):
     """
     Process raw Metro API data (add exit availability, calculations, etc.)
 
     Args:
-        process_request: ProcessRouteRequest with raw Metro API data
+        request: Request whose JSON body is a ProcessRouteRequest with raw Metro API data
 
     Returns:
         Processed route information with exit availability and calculations
     """
-    client_ip = request.client.host if request.client else "unknown"
+    process_request = await decode_body(request, ProcessRouteRequest)
     logger.info(f"Process route data request - IP: {client_ip}")
-    try:
-        from datetime import datetime, timedelta
-
-        route_data = process_request.data
-
-        # Add expected arrival times to each train
-        trip_duration_sec = route_data.get("trip", {}).get("duration", 0) * 60
-
-        for train in route_data.get("trains", []):
-            estimated_min = train.get("estimated", 0)
-            total_time_sec = estimated_min * 60 + trip_duration_sec
-            arrival_time = datetime.now() + timedelta(seconds=total_time_sec)
-            train["arrivalAtDestination"] = arrival_time.strftime("%H:%M:%S")
-            train["totalTimeToDestinationSeconds"] = int(total_time_sec)
-
-        # Calculate earliest arrival time
-        if route_data.get("trains") and len(route_data["trains"]) > 0:
-            first_train = route_data["trains"][0]
-            route_data["earliestArrival"] = first_train.get("arrivalAtDestination", "")[
-                :5
-            ]  # HH:MM format
-
-        # Check if transfer is required and calculate options
-        if route_data.get("trip", {}).get("transfer"):
-            origin = route_data["trip"]["fromStation"]["code"]
-            destination = route_data["trip"]["toStation"]["code"]
-            transfer_options = await route_planner._find_transfer_options(
-                origin, destination, route_data
-            )
-            route_data["transferOptions"] = transfer_options
-
-            # Update earliest arrival if transfer is faster
-            if transfer_options and len(transfer_options) > 0:
-                transfer_arrival = transfer_options[0].get("expectedArrival")
-                if transfer_arrival:
-                    route_data["earliestArrival"] = transfer_arrival
-
-        # Add exit availability based on current time
-        if "exits" in route_data:
-            if "origin" in route_data["exits"]:
-                route_data["exits"]["origin"] = metro_client.filter_available_exits(
-                    route_data["exits"]["origin"]
-                )
-            if "destiny" in route_data["exits"]:
-                route_data["exits"]["destiny"] = metro_client.filter_available_exits(
-                    route_data["exits"]["destiny"]
-                )
-
-        # Recalculate CO2 values (API provides g/km, we need to convert to kg)
-        if "co2Metro" in route_data:
-            co2_data = route_data["co2Metro"]
-            # Convert g/km to kg by multiplying by distance and dividing by 1000
-            # Convert to float in case they're strings
-            metro_co2_g_km = float(co2_data.get("co2metro", 0))
-            car_co2_g_km = float(co2_data.get("co2Car", 0))
-            metro_distance = float(co2_data.get("metroDistance", 0))
-            google_distance = float(co2_data.get("googleDistance", 0))
-
-            metro_co2_kg = (metro_co2_g_km * metro_distance) / 1000
-            car_co2_kg = (car_co2_g_km * google_distance) / 1000
-            diff_kg = car_co2_kg - metro_co2_kg
-
-            # Update the values with formatted strings
-            co2_data["co2metro"] = f"{metro_co2_kg:.2f}"
-            co2_data["co2Car"] = f"{car_co2_kg:.2f}"
-            co2_data["diff"] = f"{diff_kg:.2f}"
-
-        # Add formatted information
-        route_data["formatted"] = metro_client.format_complete_info(route_data)
-
-        return JSONResponse(content=route_data)
-    except Exception as e:
-        logger.error(f"Error processing route data - IP: {client_ip} - Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing route data: {str(e)}")
+    route_data = process_request.data
+
+    # Add expected arrival times to each train (one clock read for the whole list)
+    trip = route_data.get("trip", {})
+    trip_duration_sec = trip.get("duration", 0) * 60
+    now_sec = seconds_of_day(datetime.now())
+
+    for train in route_data.get("trains", []):
+        total_time_sec = train.get("estimated", 0) * 60 + trip_duration_sec
+        train["arrivalAtDestination"] = format_clock_time((now_sec + int(total_time_sec)) % 86400)
+        train["totalTimeToDestinationSeconds"] = int(total_time_sec)
+
+    # Calculate earliest arrival time
+    if route_data.get("trains") and len(route_data["trains"]) > 0:
+        first_train = route_data["trains"][0]
+        route_data["earliestArrival"] = first_train.get("arrivalAtDestination", "")[
+            :5
+        ]  # HH:MM format
+
+    # Check if transfer is required and calculate options
+    if trip.get("transfer"):
+        origin = trip["fromStation"]["code"]
+        destination = trip["toStation"]["code"]
+        transfer_options = await route_planner._find_transfer_options(
+            origin, destination, route_data
+        )
+        route_data["transferOptions"] = transfer_options
+
+        # Update earliest arrival if transfer is faster
+        if transfer_options and len(transfer_options) > 0:
+            transfer_arrival = transfer_options[0].get("expectedArrival")
+            if transfer_arrival:
+                route_data["earliestArrival"] = transfer_arrival
+
+    # Add exit availability based on current time
+    if "exits" in route_data:
+        metro_client.filter_station_exits(route_data["exits"])
+
+    # Recalculate CO2 values (API provides g/km, we need to convert to kg)
+    if "co2Metro" in route_data:
+        co2_data = route_data["co2Metro"]
+        # Convert g/km to kg by multiplying by distance and dividing by 1000
+        # Convert to float in case they're strings
+        metro_co2_g_km = float(co2_data.get("co2metro", 0))
+        car_co2_g_km = float(co2_data.get("co2Car", 0))
+        metro_distance = float(co2_data.get("metroDistance", 0))
+        google_distance = float(co2_data.get("googleDistance", 0))
+
+        metro_co2_kg = (metro_co2_g_km * metro_distance) / 1000
+        car_co2_kg = (car_co2_g_km * google_distance) / 1000
+        diff_kg = car_co2_kg - metro_co2_kg
+
+        # Update the values with formatted strings
+        co2_data["co2metro"] = f"{metro_co2_kg:.2f}"
+        co2_data["co2Car"] = f"{car_co2_kg:.2f}"
+        co2_data["diff"] = f"{diff_kg:.2f}"
+
+    # Add formatted information
+    route_data["formatted"] = metro_client.format_complete_info(route_data)
+
+    return route_data
 
 
 @app.get("/api/health")
-async def health_check(request: Request):
+async def health_check(client_ip: ClientIP):
     """Health check endpoint"""
-    client_ip = request.client.host if request.client else "unknown"
     logger.debug(f"Health check - IP: {client_ip}")
     is_night = metro_client.is_nighttime()
     return {
@@ -364,11 +576,7 @@ async def get_server_time():
     Returns:
         Current server time as ISO 8601 string and Unix timestamp in milliseconds
     """
-    import pytz
-
-    # Get Madrid timezone
-    madrid_tz = pytz.timezone("Europe/Madrid")
-    now_madrid = datetime.now(madrid_tz)
+    now_madrid = datetime.now(MADRID_TZ)
 
     return {
         "timestamp": int(now_madrid.timestamp() * 1000),  # milliseconds
@@ -378,79 +586,32 @@ async def get_server_time():
 
 
 @app.get("/api/stations")
-async def get_stations(request: Request):
+async def get_stations(request: Request, client_ip: ClientIP):
     """
     Get list of Metro Bilbao stations
 
     Returns:
         Dictionary of station codes and names
     """
-    client_ip = request.client.host if request.client else "unknown"
     logger.info(f"Stations list requested - IP: {client_ip}")
-    # LINE 1 (Plentzia ↔ Etxebarri)
-    # LINE 2 (Kabiezes ↔ Basauri)
-    # LINE 3 (Matiko ↔ Kukullaga)
-    stations = {
-        "PLE": "Plentzia",
-        "SOP": "Sopela",
-        "URD": "Urduliz",
-        "LAR": "Larrabasterra",
-        "BER": "Berango",
-        "IBB": "Ibarbengoa",
-        "BID": "Bidezabal",
-        "ALG": "Algorta",
-        "AIB": "Aiboa",
-        "NEG": "Neguri",
-        "GOB": "Gobela",
-        "ARE": "Areeta",
-        "LAM": "Lamiako",
-        "LEI": "Leioa",
-        "AST": "Astrabudua",
-        "ERA": "Erandio",
-        "LUT": "Lutxana",
-        "SIN": "San Inazio",
-        "SAR": "Sarriko",
-        "DEU": "Deustu",
-        "SAM": "Santimami/San Mamés",
-        "IND": "Indautxu",
-        "MOY": "Moyua",
-        "ABA": "Abando",
-        "CAV": "Zazpikaleak/Casco Viejo",
-        "SAN": "Santutxu",
-        "BAS": "Basarrate",
-        "BOL": "Bolueta",
-        "ETX": "Etxebarri",
-        "KAB": "Kabiezes",
-        "STZ": "Santurtzi",
-        "PEN": "Peñota",
-        "POR": "Portugalete",
-        "ABT": "Abatxolo",
-        "SES": "Sestao",
-        "URB": "Urbinaga",
-        "BAG": "Bagatza",
-        "BAR": "Barakaldo",
-        "ANS": "Ansio",
-        "GUR": "Gurutzeta/Cruces",
-        "ARZ": "Ariz",
-        "BSR": "Basauri",
-        # "MAT": "Matiko",
-        # "URI": "Uribarri",
-        # "ZUR": "Zurbaranbarri",
-        # "TXU": "Txurdinaga",
-        # "OTX": "Otxarkoaga",
-        # "KUK": "Kukullaga",
-    }
-
-    return {"stations": stations}
+    if is_not_modified(request, STATIONS_ETAG):
+        return Response(status_code=304, headers=STATIONS_HEADERS)
+    return Response(content=STATIONS_JSON, media_type="application/json", headers=STATIONS_HEADERS)
 
 
 # Mount static files directory
-static_dir = os.path.join(os.path.dirname(__file__), "static")
-if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+if os.path.exists(STATIC_DIR):
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host="0.0.0.0", port=8001)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="uvloop",
+        http="httptools",
+        workers=get_settings().workers,
+    )
@@ -1,15 +1,41 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from functools import lru_cache
 from datetime import datetime, time
 import httpx
+import orjson
 from config import get_settings
 
 
+# Exit status labels used by format_exit_info
+EXIT_OPEN = "✅ OPEN"
+EXIT_CLOSED = "🔒 CLOSED"
+EXIT_ELEVATOR = "♿ Elevator"
+EXIT_STAIRS = "🚶 Stairs"
+EXIT_NOCTURNAL = "🌙 24h"
+EXIT_DAY_ONLY = "☀️ Day only"
+
+
 class MetroClient:
     """Client for interacting with Metro Bilbao API"""
 
     def __init__(self):
         self.settings = get_settings()
         self.base_url = self.settings.api_base_url
+        # Night boundaries are fixed for the process lifetime - parse them once
+        self._night_start = time.fromisoformat(self.settings.night_time_start)
+        self._night_end = time.fromisoformat(self.settings.night_time_end)
+        # One pooled client for the whole process so upstream calls reuse
+        # keep-alive connections instead of a new TLS handshake each time
+        self._client = httpx.AsyncClient(
+            timeout=30.0,
+            verify=False,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            http2=True,
+        )
+
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
 
     async def get_route_info(self, origin: str, destination: str) -> Dict[str, Any]:
         """
@@ -24,18 +50,15 @@ class MetroClient:
         """
         url = f"{self.base_url}/{origin}/{destination}"
 
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.json()
+        response = await self._client.get(url)
+        response.raise_for_status()
+        return orjson.loads(response.content)
 
     def is_nighttime(self) -> bool:
         """Check if current time is nighttime"""
         current_time = datetime.now().time()
-
-        # Parse night time settings
-        night_start = time.fromisoformat(self.settings.night_time_start)
-        night_end = time.fromisoformat(self.settings.night_time_end)
+        night_start = self._night_start
+        night_end = self._night_end
 
         # Handle case where night period crosses midnight
         if night_start > night_end:
@@ -43,17 +66,21 @@ class MetroClient:
         else:
             return night_start <= current_time < night_end
 
-    def filter_available_exits(self, exits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def filter_available_exits(
+        self, exits: List[Dict[str, Any]], is_night: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
         """
         Filter exits based on whether they're open at current time
 
         Args:
             exits: List of exit dictionaries
+            is_night: Precomputed night flag; checked now if omitted
 
         Returns:
             List of exits with availability status added
         """
-        is_night = self.is_nighttime()
+        if is_night is None:
+            is_night = self.is_nighttime()
 
         for exit_info in exits:
             # Exit is available if it's not nighttime OR if it's a nocturnal exit
@@ -62,6 +89,23 @@ class MetroClient:
 
         return exits
 
+    def filter_station_exits(self, exits: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add availability to the origin and destination exit lists in one pass
+
+        Args:
+            exits: Exits dictionary with optional "origin" and "destiny" lists
+
+        Returns:
+            The same dictionary, with availability status added to every exit
+        """
+        is_night = self.is_nighttime()
+
+        for key in ("origin", "destiny"):
+            self.filter_available_exits(exits.get(key, ()), is_night)
+
+        return exits
+
     def format_train_info(self, trains: List[Dict[str, Any]]) -> str:
         """Format train information for display"""
         if not trains:
@@ -106,33 +150,33 @@ class MetroClient:
 
         return "\n".join(lines)
 
+    @staticmethod
+    def _format_exit_lines(exits: List[Dict[str, Any]], is_night: bool):
+        """Yield one display entry per exit"""
+        for exit_info in exits:
+            # Exits normally already carry "available" from filter_station_exits
+            nocturnal = exit_info.get("nocturnal", False)
+            available = exit_info.get("available", not is_night or nocturnal)
+            yield (
+                f"  {EXIT_OPEN if available else EXIT_CLOSED} - {exit_info['name']}\n"
+                f"    {EXIT_ELEVATOR if exit_info.get('elevator') else EXIT_STAIRS} | "
+                f"{EXIT_NOCTURNAL if nocturnal else EXIT_DAY_ONLY}"
+            )
+
     def format_exit_info(self, exits: Dict[str, Any]) -> str:
         """Format exit information for display"""
         is_night = self.is_nighttime()
 
-        lines = [f"\n🚪 Station Exits {'(Night Mode)' if is_night else '(Day Mode)'}:", "=" * 60]
-
-        # Origin exits
-        lines.append("\n📍 Origin Station Exits:")
-        origin_exits = self.filter_available_exits(exits.get("origin", []))
-        for exit_info in origin_exits:
-            status = "✅ OPEN" if exit_info["available"] else "🔒 CLOSED"
-            elevator = "♿ Elevator" if exit_info.get("elevator") else "🚶 Stairs"
-            nocturnal = "🌙 24h" if exit_info.get("nocturnal") else "☀️ Day only"
-
-            lines.append(f"  {status} - {exit_info['name']}\n    {elevator} | {nocturnal}")
-
-        # Destination exits
-        lines.append("\n📍 Destination Station Exits:")
-        destiny_exits = self.filter_available_exits(exits.get("destiny", []))
-        for exit_info in destiny_exits:
-            status = "✅ OPEN" if exit_info["available"] else "🔒 CLOSED"
-            elevator = "♿ Elevator" if exit_info.get("elevator") else "🚶 Stairs"
-            nocturnal = "🌙 24h" if exit_info.get("nocturnal") else "☀️ Day only"
-
-            lines.append(f"  {status} - {exit_info['name']}\n    {elevator} | {nocturnal}")
-
-        return "\n".join(lines)
+        return "\n".join(
+            [
+                f"\n🚪 Station Exits {'(Night Mode)' if is_night else '(Day Mode)'}:",
+                "=" * 60,
+                "\n📍 Origin Station Exits:",
+                *self._format_exit_lines(exits.get("origin", []), is_night),
+                "\n📍 Destination Station Exits:",
+                *self._format_exit_lines(exits.get("destiny", []), is_night),
+            ]
+        )
 
     def format_complete_info(self, data: Dict[str, Any]) -> str:
         """Format all information for display"""
@@ -154,3 +198,9 @@ class MetroClient:
                 sections.append(f"  • {msg}")
 
         return "\n".join(sections)
+
+
+@lru_cache()
+def get_metro_client():
+    """Get the shared client instance (one connection pool per process)"""
+    return MetroClient()
@@ -0,0 +1,47 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlightTTLCache:
+    """Bounded TTL cache where concurrent misses for a key share one fetch"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        # key -> (expiry, shared fetch task), oldest first
+        self._entries: Dict[Hashable, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_fetch(self, key: Hashable, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result for key, fetching it with coro_factory on a miss
+
+        Results are reused for `ttl` seconds. Callers that go away don't cancel
+        the shared fetch, and failed fetches are not cached.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return await asyncio.shield(entry[1])
+
+        # Re-insert at the end so dict order stays oldest-first
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_size:
+            for stale_key in [k for k, (expiry, _) in self._entries.items() if expiry <= now]:
+                del self._entries[stale_key]
+            # Still full of fresh entries - evict the oldest
+            while len(self._entries) >= self.max_size:
+                del self._entries[next(iter(self._entries))]
+
+        task = asyncio.ensure_future(coro_factory())
+        self._entries[key] = (now + self.ttl, task)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            # Don't keep failed lookups around
+            if self._entries.get(key, (None, None))[1] is task:
+                del self._entries[key]
+            raise
@@ -1,174 +1,165 @@
+import asyncio
+import logging
+import math
+from datetime import datetime
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
-from metro_client import MetroClient
-
-
-# Station code to name mapping
-STATION_NAMES = {
-    "PLE": "Plentzia",
-    "SOP": "Sopela",
-    "URD": "Urduliz",
-    "LAR": "Larrabasterra",
-    "BER": "Berango",
-    "IBB": "Ibarbengoa",
-    "BID": "Bidezabal",
-    "ALG": "Algorta",
-    "AIB": "Aiboa",
-    "NEG": "Neguri",
-    "GOB": "Gobela",
-    "ARE": "Areeta",
-    "LAM": "Lamiako",
-    "LEI": "Leioa",
-    "AST": "Astrabudua",
-    "ERA": "Erandio",
-    "LUT": "Lutxana",
-    "SIN": "San Inazio",
-    "SAR": "Sarriko",
-    "DEU": "Deustu",
-    "SAM": "Santimami/San Mamés",
-    "IND": "Indautxu",
-    "MOY": "Moyua",
-    "ABA": "Abando",
-    "CAV": "Zazpikaleak/Casco Viejo",
-    "SAN": "Santutxu",
-    "BAS": "Basarrate",
-    "BOL": "Bolueta",
-    "ETX": "Etxebarri",
-    "KAB": "Kabiezes",
-    "STZ": "Santurtzi",
-    "PEN": "Peñota",
-    "POR": "Portugalete",
-    "ABT": "Abatxolo",
-    "SES": "Sestao",
-    "URB": "Urbinaga",
-    "BAG": "Bagatza",
-    "BAR": "Barakaldo",
-    "ANS": "Ansio",
-    "GUR": "Gurutzeta/Cruces",
-    "ARZ": "Ariz",
-    "BSR": "Basauri",
-    # "MAT": "Matiko",
-    # "URI": "Uribarri",
-    # "ZUR": "Zurbaranbarri",
-    # "TXU": "Txurdinaga",
-    # "OTX": "Otxarkoaga",
-    # "KUK": "Kukullaga",
-}
-
-
-# Metro Bilbao network structure
-# L1: Plentzia ↔ Etxebarri
-# L2: Kabiezes ↔ Basauri
-# L3: Matiko ↔ Kukullaga
-
-METRO_NETWORK = {
-    "L1": [
-        "PLE",
-        "URD",
-        "SOP",
-        "LAR",
-        "BER",
-        "IBB",
-        "BID",
-        "ALG",
-        "AIB",
-        "NEG",
-        "GOB",
-        "ARE",
-        "LAM",
-        "LEI",
-        "AST",
-        "ERA",
-        "LUT",
-        "SIN",
-        "SAR",
-        "DEU",
-        "SAM",
-        "IND",
-        "MOY",
-        "ABA",
-        "CAV",
-        "SAN",
-        "BAS",
-        "BOL",
-        "ETX",
-    ],
-    "L2": [
-        "KAB",
-        "STZ",
-        "PEN",
-        "POR",
-        "ABT",
-        "SES",
-        "URB",
-        "BAG",
-        "BAR",
-        "ANS",
-        "GUR",
-        "ETX",
-        "ARZ",
-        "BSR",
-        "BOL",
-        "BAS",
-        "SAN",
-        "CAV",
-        "ABA",
-        "MOY",
-        "IND",
-        "SAM",
-        "DEU",
-        "SAR",
-        "SIN",
-    ],
-    "L3": ["MAT", "URI", "CAV", "ZUR", "TXU", "OTX", "KUK"],
-}
-
-# Transfer stations used for connections
-# SIN (San Inazio): L1 ↔ L2
-# CAV (Casco Viejo/Zazpikaleak): L1/L2 ↔ L3
-TRANSFER_STATIONS = {
-    "L1-L2": "SIN",  # San Inazio for L1 ↔ L2 transfers
-    "L1-L3": "CAV",  # Casco Viejo for L1 ↔ L3 transfers
-    "L2-L3": "CAV",  # Casco Viejo for L2 ↔ L3 transfers
-}
+from metro_client import MetroClient, get_metro_client
+from route_cache import SingleFlightTTLCache
+from stations import METRO_NETWORK, STATION_LINES, STATIONS, TRANSFER_STATIONS
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
+def format_clock_time(second_of_day: int) -> str:
+    """Format a second of the day as HH:MM:SS"""
+    return f"{second_of_day // 3600:02d}:{second_of_day // 60 % 60:02d}:{second_of_day % 60:02d}"
+
+
+@lru_cache(maxsize=1024)
+def _format_mm_ss(total_seconds: int) -> str:
+    """Format whole seconds as MM:SS"""
+    return f"{total_seconds // 60:02d}:{total_seconds % 60:02d}"
+
+
+@lru_cache(maxsize=1024)
+def _format_minutes(total_seconds: int) -> str:
+    """Format whole seconds as a duration (e.g., '13 minutes')"""
+    mins, secs = divmod(total_seconds, 60)
+    if secs > 0:
+        return f"{mins} min {secs} sec"
+    return f"{mins} minutes"
+
+
+def seconds_of_day(moment: datetime) -> int:
+    """Whole seconds elapsed since midnight"""
+    return moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def _build_distances() -> Dict[str, Dict[str, int]]:
+    """All-pairs stop counts over the network (Floyd-Warshall)"""
+    codes = list(STATION_LINES)
+    index = {code: i for i, code in enumerate(codes)}
+    n = len(codes)
+    inf = float("inf")
+    dist = [[0 if i == j else inf for j in range(n)] for i in range(n)]
+
+    for stations in METRO_NETWORK.values():
+        for a, b in zip(stations, stations[1:]):
+            dist[index[a]][index[b]] = dist[index[b]][index[a]] = 1
+
+    for k in range(n):
+        row_k = dist[k]
+        for i in range(n):
+            row_i = dist[i]
+            d_ik = row_i[k]
+            if d_ik == inf:
+                continue
+            for j in range(n):
+                if d_ik + row_k[j] < row_i[j]:
+                    row_i[j] = d_ik + row_k[j]
+
+    return {
+        a: {b: int(dist[index[a]][index[b]]) for b in codes if dist[index[a]][index[b]] != inf}
+        for a in codes
+    }
+
+
+def _shared_line(a: str, b: str) -> Optional[str]:
+    """First line (in METRO_NETWORK order) serving both stations"""
+    for line in STATION_LINES.get(a, ()):
+        if line in STATION_LINES.get(b, ()):
+            return line
+    return None
+
+
+def _build_best_transfers() -> Dict[tuple, tuple]:
+    """
+    Best single-transfer itinerary for every pair without a direct line
+
+    Returns:
+        (origin, destination) -> (transfer station, first line, second line,
+        stops to transfer, stops from transfer)
+    """
+    interchanges = [code for code, lines in STATION_LINES.items() if len(lines) > 1]
+    best = {}
+
+    for origin in STATION_LINES:
+        for destination in STATION_LINES:
+            if origin == destination or _shared_line(origin, destination):
+                continue
+
+            candidates = []
+            for station in interchanges:
+                first_line = _shared_line(origin, station)
+                second_line = _shared_line(station, destination)
+                if first_line and second_line:
+                    first_hops = STATION_DISTANCES[origin][station]
+                    second_hops = STATION_DISTANCES[station][destination]
+                    # Equal-length options: prefer the designated station for this line pair
+                    designated = TRANSFER_STATIONS.get("-".join(sorted((first_line, second_line))))
+                    rank = (first_hops + second_hops, station != designated)
+                    candidates.append(
+                        (rank, (station, first_line, second_line, first_hops, second_hops))
+                    )
+
+            if candidates:
+                best[(origin, destination)] = min(candidates)[1]
+
+    return best
+
+
+# Routing tables precomputed once at import - the network is static
+STATION_DISTANCES = _build_distances()
+BEST_TRANSFERS = _build_best_transfers()
 
 
 class RoutePlanner:
     """Plan routes between stations, including transfers"""
 
-    def __init__(self):
-        self.metro_client = MetroClient()
+    # Upper bound on cached transfer legs
+    LEG_CACHE_MAX_SIZE = 256
+
+    def __init__(self, metro_client: Optional[MetroClient] = None):
+        self.metro_client = metro_client or get_metro_client()
+        self._leg_cache = SingleFlightTTLCache(
+            self.metro_client.settings.auto_refresh_interval, self.LEG_CACHE_MAX_SIZE
+        )
+        self._fetch_transfer_legs = self.metro_client.settings.transfer_leg_lookup
+
+    async def _cached_route_info(self, origin: str, destination: str) -> Dict[str, Any]:
+        """
+        Fetch a transfer leg, reusing results for one refresh interval
+
+        Legs are only read, never mutated, so every caller shares the same dict.
+        Concurrent callers for the same leg await the same in-flight fetch.
+        """
+        return await self._leg_cache.get_or_fetch(
+            (origin, destination), lambda: self.metro_client.get_route_info(origin, destination)
+        )
 
     @staticmethod
     def _format_time(total_seconds: float) -> str:
         """Format seconds as MM:SS"""
-        mins = int(total_seconds // 60)
-        secs = int(total_seconds % 60)
-        return f"{mins:02d}:{secs:02d}"
+        return _format_mm_ss(math.floor(total_seconds))
 
     @staticmethod
     def _format_duration(total_seconds: float) -> str:
         """Format duration in minutes (e.g., '13 minutes')"""
-        mins = int(total_seconds // 60)
-        secs = int(total_seconds % 60)
-        if secs > 0:
-            return f"{mins} min {secs} sec"
-        return f"{mins} minutes"
+        return _format_minutes(math.floor(total_seconds))
 
     @staticmethod
-    def _calculate_arrival_time(departure_seconds: float) -> str:
-        """Calculate expected arrival time from now"""
-        from datetime import datetime, timedelta
-
-        arrival = datetime.now() + timedelta(seconds=departure_seconds)
-        return arrival.strftime("%H:%M:%S")
+    def _calculate_arrival_time(departure_seconds: float, now: datetime) -> str:
+        """Calculate expected arrival time relative to `now`"""
+        return format_clock_time((seconds_of_day(now) + int(departure_seconds)) % 86400)
 
     def _find_transfer_station(self, origin: str, destination: str) -> Optional[str]:
         """
         Find the optimal transfer station between origin and destination
 
-        Only 2 transfer stations are used:
-        - SIN (Abando): for L1 ↔ L2 transfers
-        - CAD (Casco Viejo): for L1/L2 ↔ L3 transfers
+        Looked up in BEST_TRANSFERS, which picks the interchange with the
+        fewest total stops (SIN for L1 ↔ L2, CAV for L1/L2 ↔ L3).
 
         Args:
             origin: Origin station code
@@ -177,31 +168,8 @@ class RoutePlanner:
         Returns:
             Transfer station code or None if no transfer needed
         """
-        # Find which lines contain origin and destination
-        origin_line = None
-        destination_line = None
-
-        for line, stations in METRO_NETWORK.items():
-            if origin in stations:
-                origin_line = line
-            if destination in stations:
-                destination_line = line
-
-        if not origin_line or not destination_line or origin_line == destination_line:
-            return None
-
-        # Determine transfer station based on line combination
-        lines = {origin_line, destination_line}
-
-        # L1 ↔ L2: use SIN (Abando)
-        if lines == {"L1", "L2"}:
-            return "SIN"
-
-        # L1 ↔ L3 or L2 ↔ L3: use CAD (Casco Viejo)
-        if "L3" in lines:
-            return "CAD"
-
-        return None
+        best = BEST_TRANSFERS.get((origin, destination))
+        return best[0] if best else None
 
     async def get_route(self, origin: str, destination: str) -> Dict[str, Any]:
         """
@@ -214,19 +182,31 @@ class RoutePlanner:
         Returns:
             Complete route information including transfers if needed
         """
-        # Fetch data from API
-        route_data = await self.metro_client.get_route_info(origin, destination)
-
-        # Add expected arrival times to each train
-        from datetime import datetime, timedelta
+        # Fetch data from API. When the pair needs a transfer, fetch both legs
+        # through the expected transfer station at the same time
+        transfer_legs = None
+        expected_transfer = self._find_transfer_station(origin, destination)
+        if expected_transfer and self._fetch_transfer_legs:
+            route_data, *legs = await asyncio.gather(
+                self.metro_client.get_route_info(origin, destination),
+                self._cached_route_info(origin, expected_transfer),
+                self._cached_route_info(expected_transfer, destination),
+                return_exceptions=True,
+            )
+            if isinstance(route_data, BaseException):
+                raise route_data
+            transfer_legs = {expected_transfer: legs}
+        else:
+            route_data = await self.metro_client.get_route_info(origin, destination)
 
-        trip_duration_sec = route_data["trip"].get("duration", 0) * 60
+        # Add expected arrival times to each train (one clock read for the whole list)
+        trip = route_data["trip"]
+        trip_duration_sec = trip.get("duration", 0) * 60
+        now_sec = seconds_of_day(datetime.now())
 
         for train in route_data.get("trains", []):
-            estimated_min = train.get("estimated", 0)
-            total_time_sec = estimated_min * 60 + trip_duration_sec
-            arrival_time = datetime.now() + timedelta(seconds=total_time_sec)
-            train["arrivalAtDestination"] = arrival_time.strftime("%H:%M:%S")
+            total_time_sec = train.get("estimated", 0) * 60 + trip_duration_sec
+            train["arrivalAtDestination"] = format_clock_time((now_sec + int(total_time_sec)) % 86400)
             train["totalTimeToDestinationSeconds"] = int(total_time_sec)
 
         # Calculate earliest arrival time
@@ -235,9 +215,11 @@ class RoutePlanner:
             route_data["earliestArrival"] = first_train.get("arrivalAtDestination")
 
         # Check if transfer is required
-        if route_data["trip"]["transfer"]:
+        if trip["transfer"]:
             # Find transfer options
-            transfer_options = await self._find_transfer_options(origin, destination, route_data)
+            transfer_options = await self._find_transfer_options(
+                origin, destination, route_data, transfer_legs
+            )
             route_data["transferOptions"] = transfer_options
 
             # Update earliest arrival if transfer is faster
@@ -246,21 +228,23 @@ class RoutePlanner:
                 if transfer_arrival:
                     route_data["earliestArrival"] = transfer_arrival
 
+        # Add exit availability
+        exits = route_data["exits"]
+        exits.setdefault("origin", [])
+        exits.setdefault("destiny", [])
+        self.metro_client.filter_station_exits(exits)
+
         # Add formatted information
         route_data["formatted"] = self.metro_client.format_complete_info(route_data)
 
-        # Add exit availability
-        route_data["exits"]["origin"] = self.metro_client.filter_available_exits(
-            route_data["exits"].get("origin", [])
-        )
-        route_data["exits"]["destiny"] = self.metro_client.filter_available_exits(
-            route_data["exits"].get("destiny", [])
-        )
-
         return route_data
 
     async def _find_transfer_options(
-        self, origin: str, destination: str, route_data: Dict[str, Any]
+        self,
+        origin: str,
+        destination: str,
+        route_data: Dict[str, Any],
+        transfer_legs: Optional[Dict[str, list]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Find possible transfer options between stations
@@ -269,91 +253,117 @@ class RoutePlanner:
             origin: Origin station code
             destination: Destination station code
             route_data: Original route data from API
+            transfer_legs: Already fetched [first leg, second leg] API results
+                (or exceptions), keyed by transfer station
 
         Returns:
             List of transfer options with timing information
         """
+        trip = route_data["trip"]
         transfer_options = []
+        origin_trains = route_data.get("trains")
+
+        # Without a train leaving the origin there is no connection to time
+        if trip["transfer"] and origin_trains:
+            # Get transfer station code - calculate it if not provided by API,
+            # falling back to "Unknown" if we can't determine it either
+            api_transfer = trip.get("transferStation")
+            transfer_station = (
+                (api_transfer if api_transfer != "Unknown" else None)
+                or self._find_transfer_station(origin, destination)
+                or "Unknown"
+            )
 
-        if route_data["trip"]["transfer"]:
-            # Get transfer station code - calculate it if not provided by API
-            transfer_station = route_data["trip"].get("transferStation")
-
-            if not transfer_station or transfer_station == "Unknown":
-                # Calculate the optimal transfer station
-                transfer_station = self._find_transfer_station(origin, destination)
-
-            if not transfer_station:
-                # Fallback if we can't determine transfer station
-                transfer_station = "Unknown"
-
-            # Calculate timing for first leg (convert to seconds)
-            first_leg_duration_sec = (route_data["trip"].get("duration", 0) // 2) * 60
+            # Fetch both legs concurrently (unless get_route already did): origin to
+            # transfer for the real first leg duration, transfer to destination
+            # for the connecting trains
+            if transfer_legs and transfer_station in transfer_legs:
+                first_route, transfer_route = transfer_legs[transfer_station]
+            elif self._fetch_transfer_legs:
+                first_route, transfer_route = await asyncio.gather(
+                    self._cached_route_info(origin, transfer_station),
+                    self._cached_route_info(transfer_station, destination),
+                    return_exceptions=True,
+                )
+            else:
+                first_route = transfer_route = None
+
+            # Calculate timing for each leg in minutes, then seconds. Without upstream
+            # data, split the trip duration by the number of stops on each side
+            trip_duration = trip.get("duration", 0)
+            first_hops = STATION_DISTANCES.get(origin, {}).get(transfer_station)
+            second_hops = STATION_DISTANCES.get(transfer_station, {}).get(destination)
+            if isinstance(first_route, dict) and first_route.get("trip", {}).get("duration"):
+                first_leg_min = first_route["trip"]["duration"]
+            elif first_hops is not None and second_hops is not None and first_hops + second_hops:
+                first_leg_min = round(trip_duration * first_hops / (first_hops + second_hops))
+            else:
+                first_leg_min = trip_duration // 2
+            first_leg_duration_sec = first_leg_min * 60
 
             # Get the next train departure time from origin (convert to seconds)
-            first_train_departure_sec = 0
-            if route_data.get("trains") and len(route_data["trains"]) > 0:
-                first_train_departure_sec = route_data["trains"][0].get("estimated", 0) * 60
+            first_train_departure_sec = origin_trains[0].get("estimated", 0) * 60
 
             # Calculate arrival time at transfer station
             arrival_at_transfer_sec = first_train_departure_sec + first_leg_duration_sec
 
             # Get second line information
-            second_line = route_data["trip"].get("secondLine", route_data["trip"]["line"])
+            second_line = trip.get("secondLine", trip["line"])
 
-            # Fetch train times from transfer station to destination
             # Minimum 30 seconds transfer time (time to walk between platforms)
             transfer_wait_sec = 30  # Default fallback
-            second_leg_duration_sec = (
-                route_data["trip"].get("duration", 0) - (first_leg_duration_sec // 60)
-            ) * 60
+            second_leg_duration_sec = None
 
             try:
-                # Get train schedule from transfer station to destination
-                transfer_route = await self.metro_client.get_route_info(
-                    transfer_station, destination
-                )
-
-                if transfer_route.get("trains"):
-                    # Find the first train that departs after we arrive at transfer station
-                    arrival_at_transfer_min = arrival_at_transfer_sec / 60
-                    for train in transfer_route["trains"]:
-                        train_departure_time = train.get("estimated", 0)
-
-                        # If this train departs after we arrive, use it
-                        # Add minimum 30 seconds for platform transfer
-                        if train_departure_time * 60 >= arrival_at_transfer_sec:
-                            transfer_wait_sec = max(
-                                30, train_departure_time * 60 - arrival_at_transfer_sec
-                            )
-                            break
+                # Train schedule from transfer station to destination
+                if isinstance(transfer_route, Exception):
+                    raise transfer_route
+
+                trains = transfer_route.get("trains") if transfer_route else None
+                if trains:
+                    # First train that departs after we arrive at the transfer station
+                    connection = next(
+                        (t for t in trains if t.get("estimated", 0) * 60 >= arrival_at_transfer_sec),
+                        None,
+                    )
+                    # Add minimum 30 seconds for platform transfer
+                    if connection is not None:
+                        transfer_wait_sec = max(
+                            30, connection.get("estimated", 0) * 60 - arrival_at_transfer_sec
+                        )
                     else:
-                        # If no train found departing after arrival, use the first train's time as minimum wait
-                        if transfer_route["trains"]:
-                            transfer_wait_sec = max(
-                                30, transfer_route["trains"][0].get("estimated", 5) * 60
-                            )
+                        # No train departs after arrival: use the first train's time as minimum wait
+                        transfer_wait_sec = max(30, trains[0].get("estimated", 5) * 60)
 
                     # Use actual duration from transfer to destination
-                    second_leg_duration_sec = (
-                        transfer_route["trip"].get("duration", second_leg_duration_sec // 60) * 60
-                    )
+                    second_leg_min = transfer_route["trip"].get("duration")
+                    if second_leg_min is not None:
+                        second_leg_duration_sec = second_leg_min * 60
             except Exception as e:
                 # If API call fails, fall back to estimated times
-                print(f"Could not fetch transfer train times: {e}")
+                logger.warning("Could not fetch transfer train times: %s", e)
                 transfer_wait_sec = 30  # Minimum 30 seconds wait time at transfer
 
+            if second_leg_duration_sec is None:
+                # No upstream duration: the rest of the trip after the first leg
+                second_leg_duration_sec = (trip_duration - first_leg_min) * 60
+
             total_time_sec = first_leg_duration_sec + transfer_wait_sec + second_leg_duration_sec
 
             # Get station names
-            transfer_station_name = STATION_NAMES.get(transfer_station, transfer_station)
-            origin_name = route_data["trip"]["fromStation"].get(
-                "name", STATION_NAMES.get(origin, origin)
-            )
-            destination_name = route_data["trip"]["toStation"].get(
-                "name", STATION_NAMES.get(destination, destination)
+            # (only fall back to the local table when the API gives no name)
+            station_name = STATIONS.get
+            transfer_station_name = station_name(transfer_station, transfer_station)
+            origin_name = trip["fromStation"].get("name") or station_name(origin, origin)
+            destination_name = trip["toStation"].get("name") or station_name(
+                destination, destination
             )
 
+            # One clock read so every time in the option is consistent
+            now = datetime.now()
+            second_departure_sec = arrival_at_transfer_sec + transfer_wait_sec
+            arrival_at_destination_sec = second_departure_sec + second_leg_duration_sec
+
             option = {
                 "description": f"Transfer at {transfer_station_name}",
                 "firstLeg": {
@@ -363,13 +373,13 @@ class RoutePlanner:
                     "toName": transfer_station_name,
                     "duration": first_leg_duration_sec,
                     "durationFormatted": self._format_duration(first_leg_duration_sec),
-                    "line": route_data["trip"]["line"],
+                    "line": trip["line"],
                     "departure": first_train_departure_sec,
                     "departureFormatted": self._format_time(first_train_departure_sec),
-                    "departureTime": self._calculate_arrival_time(first_train_departure_sec),
+                    "departureTime": self._calculate_arrival_time(first_train_departure_sec, now),
                     "arrival": arrival_at_transfer_sec,
                     "arrivalFormatted": self._format_time(arrival_at_transfer_sec),
-                    "arrivalTime": self._calculate_arrival_time(arrival_at_transfer_sec),
+                    "arrivalTime": self._calculate_arrival_time(arrival_at_transfer_sec, now),
                 },
                 "transferWait": transfer_wait_sec,
                 "transferWaitFormatted": self._format_duration(transfer_wait_sec),
@@ -381,24 +391,16 @@ class RoutePlanner:
                     "duration": second_leg_duration_sec,
                     "durationFormatted": self._format_duration(second_leg_duration_sec),
                     "line": second_line,
-                    "departure": arrival_at_transfer_sec + transfer_wait_sec,
-                    "departureFormatted": self._format_time(
-                        arrival_at_transfer_sec + transfer_wait_sec
-                    ),
-                    "departureTime": self._calculate_arrival_time(
-                        arrival_at_transfer_sec + transfer_wait_sec
-                    ),
-                    "arrival": arrival_at_transfer_sec + transfer_wait_sec + second_leg_duration_sec,
-                    "arrivalFormatted": self._format_time(
-                        arrival_at_transfer_sec + transfer_wait_sec + second_leg_duration_sec
-                    ),
-                    "arrivalTime": self._calculate_arrival_time(
-                        arrival_at_transfer_sec + transfer_wait_sec + second_leg_duration_sec
-                    ),
+                    "departure": second_departure_sec,
+                    "departureFormatted": self._format_time(second_departure_sec),
+                    "departureTime": self._calculate_arrival_time(second_departure_sec, now),
+                    "arrival": arrival_at_destination_sec,
+                    "arrivalFormatted": self._format_time(arrival_at_destination_sec),
+                    "arrivalTime": self._calculate_arrival_time(arrival_at_destination_sec, now),
                 },
                 "totalDuration": total_time_sec,
                 "totalDurationFormatted": self._format_duration(total_time_sec),
-                "expectedArrival": self._calculate_arrival_time(total_time_sec),
+                "expectedArrival": self._calculate_arrival_time(total_time_sec, now),
             }
 
             transfer_options.append(option)
@@ -421,59 +423,71 @@ class RoutePlanner:
         """
         total_time = train_departure + trip_duration + transfer_wait
 
+        if transfer_wait > 0:
+            message = (
+                f"Depart in {train_departure} min → {trip_duration} min travel → "
+                f"{transfer_wait} min transfer → Total: {total_time} minutes"
+            )
+        else:
+            message = (
+                f"Depart in {train_departure} min → {trip_duration} min travel → "
+                f"Total: {total_time} minutes"
+            )
+
         return {
             "departureInMinutes": train_departure,
             "tripDuration": trip_duration,
             "transferWait": transfer_wait,
             "totalMinutes": total_time,
-            "message": f"Depart in {train_departure} min → {trip_duration} min travel → "
-            f"{f'{transfer_wait} min transfer → ' if transfer_wait > 0 else ''}"
-            f"Total: {total_time} minutes",
+            "message": message,
         }
 
+    @staticmethod
+    def _format_leg(marker: str, leg: Dict[str, Any]) -> str:
+        """Format one transfer leg as a display block"""
+        duration = (
+            leg["durationFormatted"] if "durationFormatted" in leg else f"{leg['duration']} min"
+        )
+        block = f"  {marker} {leg['from']} → {leg['to']}\n     Line: {leg['line']}, Duration: {duration}"
+
+        # Show detailed departure and arrival timing
+        if "departure" in leg and "arrival" in leg:
+            depart_fmt = (
+                leg["departureFormatted"]
+                if "departureFormatted" in leg
+                else f"{leg['departure']} min"
+            )
+            arrival_fmt = (
+                leg["arrivalFormatted"] if "arrivalFormatted" in leg else f"{leg['arrival']} min"
+            )
+            block += f"\n     Depart: +{depart_fmt}, Arrive: +{arrival_fmt}"
+
+        return block
+
     def format_transfer_info(self, transfer_options: List[Dict[str, Any]]) -> str:
         """Format transfer options for display"""
         if not transfer_options:
             return ""
 
-        lines = ["\n🔄 Transfer Options:", "=" * 60]
+        blocks = ["\n🔄 Transfer Options:\n" + "=" * 60]
 
         for i, option in enumerate(transfer_options, 1):
-            lines.append(f"\nOption {i}:")
-            lines.append(f"  1️⃣ {option['firstLeg']['from']} → {option['firstLeg']['to']}")
-            lines.append(
-                f"     Line: {option['firstLeg']['line']}, Duration: {option['firstLeg'].get('durationFormatted', str(option['firstLeg']['duration']) + ' min')}"
+            wait_fmt = (
+                option["transferWaitFormatted"]
+                if "transferWaitFormatted" in option
+                else f"{option['transferWait']} minutes"
             )
-
-            # Show detailed transfer timing
-            first_leg = option["firstLeg"]
-            if "departure" in first_leg and "arrival" in first_leg:
-                depart_fmt = first_leg.get(
-                    "departureFormatted", str(first_leg["departure"]) + " min"
-                )
-                arrival_fmt = first_leg.get("arrivalFormatted", str(first_leg["arrival"]) + " min")
-                lines.append(f"     Depart: +{depart_fmt}, Arrive: +{arrival_fmt}")
-
-            wait_fmt = option.get("transferWaitFormatted", str(option["transferWait"]) + " minutes")
-            lines.append(f"  ⏱️  Transfer wait: {wait_fmt}")
-
-            lines.append(f"  2️⃣ {option['secondLeg']['from']} → {option['secondLeg']['to']}")
-            lines.append(
-                f"     Line: {option['secondLeg']['line']}, Duration: {option['secondLeg'].get('durationFormatted', str(option['secondLeg']['duration']) + ' min')}"
+            total_fmt = (
+                option["totalDurationFormatted"]
+                if "totalDurationFormatted" in option
+                else f"{option['totalDuration']} minutes"
             )
-
-            # Show second leg departure and arrival time
-            second_leg = option["secondLeg"]
-            if "departure" in second_leg and "arrival" in second_leg:
-                depart_fmt = second_leg.get(
-                    "departureFormatted", str(second_leg["departure"]) + " min"
-                )
-                arrival_fmt = second_leg.get("arrivalFormatted", str(second_leg["arrival"]) + " min")
-                lines.append(f"     Depart: +{depart_fmt}, Arrive: +{arrival_fmt}")
-
-            total_fmt = option.get(
-                "totalDurationFormatted", str(option["totalDuration"]) + " minutes"
+            blocks.append(
+                f"\nOption {i}:\n"
+                f"{self._format_leg('1️⃣', option['firstLeg'])}\n"
+                f"  ⏱️  Transfer wait: {wait_fmt}\n"
+                f"{self._format_leg('2️⃣', option['secondLeg'])}\n"
+                f"  ⏰ Total time: {total_fmt}"
             )
-            lines.append(f"  ⏰ Total time: {total_fmt}")
 
-        return "\n".join(lines)
+        return "\n".join(blocks)
@@ -0,0 +1,148 @@
+from types import MappingProxyType
+from typing import Dict, List
+
+# Station code to name mapping - the single source of station codes
+# LINE 1 (Plentzia ↔ Etxebarri)
+# LINE 2 (Kabiezes ↔ Basauri)
+# LINE 3 (Matiko ↔ Kukullaga)
+STATIONS = MappingProxyType({
+    "PLE": "Plentzia",
+    "SOP": "Sopela",
+    "URD": "Urduliz",
+    "LAR": "Larrabasterra",
+    "BER": "Berango",
+    "IBB": "Ibarbengoa",
+    "BID": "Bidezabal",
+    "ALG": "Algorta",
+    "AIB": "Aiboa",
+    "NEG": "Neguri",
+    "GOB": "Gobela",
+    "ARE": "Areeta",
+    "LAM": "Lamiako",
+    "LEI": "Leioa",
+    "AST": "Astrabudua",
+    "ERA": "Erandio",
+    "LUT": "Lutxana",
+    "SIN": "San Inazio",
+    "SAR": "Sarriko",
+    "DEU": "Deustu",
+    "SAM": "Santimami/San Mamés",
+    "IND": "Indautxu",
+    "MOY": "Moyua",
+    "ABA": "Abando",
+    "CAV": "Zazpikaleak/Casco Viejo",
+    "SAN": "Santutxu",
+    "BAS": "Basarrate",
+    "BOL": "Bolueta",
+    "ETX": "Etxebarri",
+    "KAB": "Kabiezes",
+    "STZ": "Santurtzi",
+    "PEN": "Peñota",
+    "POR": "Portugalete",
+    "ABT": "Abatxolo",
+    "SES": "Sestao",
+    "URB": "Urbinaga",
+    "BAG": "Bagatza",
+    "BAR": "Barakaldo",
+    "ANS": "Ansio",
+    "GUR": "Gurutzeta/Cruces",
+    "ARZ": "Ariz",
+    "BSR": "Basauri",
+    # "MAT": "Matiko",
+    # "URI": "Uribarri",
+    # "ZUR": "Zurbaranbarri",
+    # "TXU": "Txurdinaga",
+    # "OTX": "Otxarkoaga",
+    # "KUK": "Kukullaga",
+})
+
+
+# Metro Bilbao network structure
+# L1: Plentzia ↔ Etxebarri
+# L2: Kabiezes ↔ Basauri
+# L3: Matiko ↔ Kukullaga
+# Stations are listed in track order - consecutive codes are adjacent stops
+
+METRO_NETWORK = {
+    "L1": [
+        "PLE",
+        "URD",
+        "SOP",
+        "LAR",
+        "BER",
+        "IBB",
+        "BID",
+        "ALG",
+        "AIB",
+        "NEG",
+        "GOB",
+        "ARE",
+        "LAM",
+        "LEI",
+        "AST",
+        "ERA",
+        "LUT",
+        "SIN",
+        "SAR",
+        "DEU",
+        "SAM",
+        "IND",
+        "MOY",
+        "ABA",
+        "CAV",
+        "SAN",
+        "BAS",
+        "BOL",
+        "ETX",
+    ],
+    "L2": [
+        "KAB",
+        "STZ",
+        "PEN",
+        "POR",
+        "ABT",
+        "SES",
+        "URB",
+        "BAG",
+        "BAR",
+        "ANS",
+        "GUR",
+        "SIN",
+        "SAR",
+        "DEU",
+        "SAM",
+        "IND",
+        "MOY",
+        "ABA",
+        "CAV",
+        "SAN",
+        "BAS",
+        "BOL",
+        "ETX",
+        "ARZ",
+        "BSR",
+    ],
+    "L3": ["MAT", "URI", "CAV", "ZUR", "TXU", "OTX", "KUK"],
+}
+
+# Transfer stations used for connections
+# SIN (San Inazio): L1 ↔ L2
+# CAV (Casco Viejo/Zazpikaleak): L1/L2 ↔ L3
+TRANSFER_STATIONS = {
+    "L1-L2": "SIN",  # San Inazio for L1 ↔ L2 transfers
+    "L1-L3": "CAV",  # Casco Viejo for L1 ↔ L3 transfers
+    "L2-L3": "CAV",  # Casco Viejo for L2 ↔ L3 transfers
+}
+
+
+def _build_station_lines() -> Dict[str, List[str]]:
+    """Map each station code to the lines that stop there"""
+    station_lines: Dict[str, List[str]] = {}
+    for line, stations in METRO_NETWORK.items():
+        for code in stations:
+            station_lines.setdefault(code, []).append(line)
+    return station_lines
+
+
+# Lines serving each station, e.g. "SIN" -> ["L1", "L2"]
+STATION_LINES = _build_station_lines()
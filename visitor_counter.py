@@ -0,0 +1,68 @@
+import base64
+import math
+import zlib
+
+
+class HyperLogLog:
+    """Fixed-size cardinality estimator over 64-bit hashes"""
+
+    def __init__(self, p: int = 14, registers: bytes = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError(f"Expected {self.m} registers, got {len(self.registers)}")
+
+        self._rank_bits = 64 - p
+        self._rank_mask = (1 << self._rank_bits) - 1
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+        # Last estimate, reset whenever a register changes
+        self._estimate = None
+
+    def add(self, hashed: int) -> bool:
+        """
+        Add a 64-bit hash to the sketch
+
+        Returns:
+            True if the sketch changed (the value is most likely new)
+        """
+        index = hashed >> self._rank_bits
+        rank = self._rank_bits - (hashed & self._rank_mask).bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            self._estimate = None
+            return True
+        return False
+
+    def count(self) -> int:
+        """
+        Estimate the number of distinct values added
+
+        The register scan is cached until the next add() that changes the sketch.
+        """
+        if self._estimate is None:
+            self._estimate = self._estimate_registers()
+        return self._estimate
+
+    def _estimate_registers(self) -> int:
+        """Raw HyperLogLog estimate over all registers"""
+        m = self.m
+        estimate = self._alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        # Small range correction (linear counting)
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                return round(m * math.log(m / zeros))
+
+        return round(estimate)
+
+    def serialize(self) -> str:
+        """Encode registers as a compact base64 string for JSON persistence"""
+        return base64.b64encode(zlib.compress(bytes(self.registers))).decode("ascii")
+
+    @classmethod
+    def deserialize(cls, data: str, p: int = 14) -> "HyperLogLog":
+        """Rebuild a sketch from `serialize()` output"""
+        return cls(p=p, registers=zlib.decompress(base64.b64decode(data)))